@@ -0,0 +1,25 @@
+# Driver codes on the 2024 grid, mapped to display names and teams
+DRIVER_DICT = {
+    'RUS': {'name': 'George Russell', 'team': 'Mercedes'},
+    'ALB': {'name': 'Alexander Albon', 'team': 'Williams'},
+    'HUL': {'name': 'Nico Hülkenberg', 'team': 'Haas'},
+    'SAI': {'name': 'Carlos Sainz Jr.', 'team': 'Ferrari'},
+    'HAM': {'name': 'Lewis Hamilton', 'team': 'Mercedes'},
+    'BOT': {'name': 'Valtteri Bottas', 'team': 'Kick Sauber'},
+    'MAG': {'name': 'Kevin Magnussen', 'team': 'Haas'},
+    'LAW': {'name': 'Liam Lawson', 'team': 'Visa Cash App RB'},
+    'COL': {'name': 'Franco Colapinto', 'team': 'Williams'},
+    'ALO': {'name': 'Fernando Alonso', 'team': 'Aston Martin'},
+    'PIA': {'name': 'Oscar Piastri', 'team': 'McLaren'},
+    'RIC': {'name': 'Daniel Ricciardo', 'team': 'Visa Cash App RB'},
+    'VER': {'name': 'Max Verstappen', 'team': 'Red Bull Racing'},
+    'STR': {'name': 'Lance Stroll', 'team': 'Aston Martin'},
+    'PER': {'name': 'Sergio Pérez', 'team': 'Red Bull Racing'},
+    'OCO': {'name': 'Esteban Ocon', 'team': 'Alpine'},
+    'GAS': {'name': 'Pierre Gasly', 'team': 'Alpine'},
+    'ZHO': {'name': 'Zhou Guanyu', 'team': 'Kick Sauber'},
+    'TSU': {'name': 'Yuki Tsunoda', 'team': 'Visa Cash App RB'},
+    'LEC': {'name': 'Charles Leclerc', 'team': 'Ferrari'},
+    'NOR': {'name': 'Lando Norris', 'team': 'McLaren'},
+    'SAR': {'name': 'Logan Sargeant', 'team': 'Williams'}
+}
@@ -1,6 +1,10 @@
 import duckdb
 import fastf1 as ff1
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
 logging.getLogger('fastf1').setLevel(logging.ERROR)
@@ -16,76 +20,151 @@ RACE_NAMES = [
     'United States Grand Prix'
 ]
 YEAR = 2024
+DB_DIR = Path(__file__).resolve().parent
+CACHE_DIR = DB_DIR / '_ff1_cache'
+LAP_SUMMARY_DIR = DB_DIR / 'lap_summary'
+TELEMETRY_DIR = DB_DIR / 'telemetry'
+MAX_WORKERS = 5
+LAP_SUMMARY_SCHEMA = pa.schema([
+    ('year', pa.int32()),
+    ('race_name', pa.string()),
+    ('driver_code', pa.string()),
+    ('lap_category', pa.string()),
+    ('lap_number', pa.int32()),
+    ('lap_time', pa.float32())
+])
+TELEMETRY_SCHEMA = pa.schema([
+    ('year', pa.int32()),
+    ('race_name', pa.string()),
+    ('driver_code', pa.string()),
+    ('lap_category', pa.string()),
+    ('lap_number', pa.int32()),
+    ('telemetry_index', pa.int32()),
+    ('X', pa.float32()),
+    ('Y', pa.float32()),
+    ('Speed', pa.float32()),
+    ('Throttle', pa.uint8()),
+    ('nGear', pa.int8()),
+    ('Brake', pa.bool_()),
+    ('RPM', pa.float32()),
+    ('Distance', pa.float32())
+])
+# Row order within each race's telemetry file, matching the app's per-lap reads
+TELEMETRY_SORT_KEYS = [
+    ('driver_code', 'ascending'),
+    ('lap_category', 'ascending'),
+    ('lap_number', 'ascending'),
+    ('telemetry_index', 'ascending')
+]
+# Roughly two laps of samples, so row-group min/max stats can skip the other laps
+TELEMETRY_ROW_GROUP_SIZE = 2_048
+
+# Lap summaries and telemetry tables are buffered here and written once per race
+_lap_rows = []
+_tel_tables = []
+
+# Cache FastF1 session data on disk so re-initializing skips the downloads
+CACHE_DIR.mkdir(exist_ok=True)
+ff1.Cache.enable_cache(str(CACHE_DIR))
+
+def has_race_data():
+    """True once at least one race has been written to Parquet"""
+    return any(LAP_SUMMARY_DIR.glob('*.parquet')) and any(TELEMETRY_DIR.glob('*.parquet'))
 
-def get_db_connection(read_only=False):
-    db_path = Path(__file__).resolve().parent / 'track_db.duckdb'
-    if not db_path.exists():
-        print(f"[DEBUG] Database not found at path: {db_path}. Creating new database...")
-        return duckdb.connect(str(db_path))
-    else:
-        print(f"[DEBUG] Connecting to DuckDB at path: {db_path}")
-        return duckdb.connect(str(db_path), read_only=read_only)
-
-def create_tables(con):
-    """Creates lap_summary and telemetry tables"""
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS lap_summary (
-        year INTEGER,
-        race_name VARCHAR,
-        driver_code VARCHAR,
-        lap_category VARCHAR,
-        lap_number INTEGER,
-        lap_time FLOAT            
-    )
+def get_db_connection():
+    """Opens an in-memory DuckDB connection with views over the race Parquet files"""
+    # Views are created per connection, so no file paths are persisted anywhere
+    con = duckdb.connect()
+    try:
+        create_views(con)
+    except Exception:
+        con.close()
+        raise
+    return con
+
+def get_race_file_name(race_name):
+    """File name of the Parquet files holding a single race"""
+    slug = race_name.strip().lower().replace(' ', '_')
+    return f'{slug}.parquet'
+
+def create_views(con):
+    """Creates lap_summary and telemetry views over the per-race Parquet files"""
+    con.execute(f"""
+    CREATE OR REPLACE VIEW lap_summary AS
+    SELECT * FROM read_parquet('{LAP_SUMMARY_DIR / '*.parquet'}')
     """)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS telemetry (
-        year INTEGER,
-        race_name VARCHAR,
-        driver_code VARCHAR,
-        lap_category VARCHAR,
-        lap_number INTEGER,
-        telemetry_index INTEGER,
-        X FLOAT,
-        Y FLOAT,
-        Speed FLOAT,
-        Throttle FLOAT,
-        nGear INTEGER,
-        Brake FLOAT,
-        RPM FLOAT,
-        Distance FLOAT
-    )
+    con.execute(f"""
+    CREATE OR REPLACE VIEW telemetry AS
+    SELECT * FROM read_parquet('{TELEMETRY_DIR / '*.parquet'}')
     """)
 
-def insert_lap_summary(con, year, race_name, driver_code, lap_category, lap_number, lap_time):
+def write_parquet(table, path, row_group_size=None):
+    """Writes via a temporary file so readers never see a partially written race"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    pq.write_table(table, tmp_path, compression='zstd', row_group_size=row_group_size)
+    tmp_path.replace(path)
+
+def insert_lap_summary(year, race_name, driver_code, lap_category, lap_number, lap_time):
+    """Buffers a lap summary row; written by flush_lap_summary"""
     if isinstance(lap_time, pd.Timedelta):
         lap_time = lap_time.total_seconds()
-    
-    con.execute("""
-    INSERT INTO lap_summary (year, race_name, driver_code, lap_category, lap_number, lap_time)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """, [year, race_name, driver_code, lap_category, lap_number, lap_time])
-
-def insert_telemetry(con, df_tel, year, race_name, driver_code, lap_category, lap_number):
-    df_tel = df_tel.copy()
-    df_tel['year'] = year
-    df_tel['race_name'] = race_name
-    df_tel['driver_code'] = driver_code
-    df_tel['lap_category'] = lap_category
-    df_tel['lap_number'] = lap_number
-    df_tel['telemetry_index'] = df_tel.index
-
-    columns = ['year', 'race_name', 'driver_code', 'lap_category', 
-               'lap_number', 'telemetry_index', 'X', 'Y', 'Speed', 
-               'Throttle', 'nGear', 'Brake', 'RPM', 'Distance']
-    df_tel = df_tel[columns]
-
-    con.register("temp_tel", df_tel)
-    con.execute("INSERT INTO telemetry SELECT * FROM temp_tel")
-    con.unregister("temp_tel")
-
-def process_race_data(year, race_name, con):
-    """Process a single race and store its data in the database"""
+
+    _lap_rows.append({
+        'year': year,
+        'race_name': race_name,
+        'driver_code': driver_code,
+        'lap_category': lap_category,
+        'lap_number': lap_number,
+        'lap_time': lap_time
+    })
+
+def flush_lap_summary(path):
+    """Writes all buffered lap summary rows to a single Parquet file"""
+    if not _lap_rows:
+        return
+    df_laps = pd.DataFrame(_lap_rows, columns=LAP_SUMMARY_SCHEMA.names)
+    write_parquet(pa.Table.from_pandas(df_laps, schema=LAP_SUMMARY_SCHEMA, preserve_index=False), path)
+    _lap_rows.clear()
+
+def insert_telemetry(df_tel, year, race_name, driver_code, lap_category, lap_number):
+    """Buffers a lap's telemetry as a typed Arrow table; written by flush_telemetry"""
+    n = len(df_tel)
+    columns = {
+        'year': np.full(n, year, dtype=np.int32),
+        'race_name': pa.repeat(pa.scalar(race_name, pa.string()), n),
+        'driver_code': pa.repeat(pa.scalar(driver_code, pa.string()), n),
+        'lap_category': pa.repeat(pa.scalar(lap_category, pa.string()), n),
+        'lap_number': np.full(n, lap_number, dtype=np.int32),
+        'telemetry_index': df_tel.index.to_numpy(dtype=np.int32)
+    }
+    for field in TELEMETRY_SCHEMA:
+        if field.name not in columns:
+            values = df_tel[field.name]
+            if pa.types.is_integer(field.type):
+                # Narrow integer columns can't hold fractional or out-of-range samples
+                info = np.iinfo(field.type.to_pandas_dtype())
+                values = values.round().clip(info.min, info.max)
+            # Missing samples are stored as nulls rather than NaN or a made-up value
+            columns[field.name] = pa.array(values, mask=values.isna().to_numpy(), type=field.type)
+
+    _tel_tables.append(pa.Table.from_pydict(columns, schema=TELEMETRY_SCHEMA))
+
+def flush_telemetry(path):
+    """Concatenates all buffered telemetry tables and writes them, sorted by lap, to a single Parquet file"""
+    if not _tel_tables:
+        return
+    tel_table = pa.concat_tables(_tel_tables).sort_by(TELEMETRY_SORT_KEYS)
+    write_parquet(tel_table, path, row_group_size=TELEMETRY_ROW_GROUP_SIZE)
+    _tel_tables.clear()
+
+def process_race_data(year, race_name):
+    """Process a single race and write its data to Parquet (runs in a worker process)"""
+    # Workers are reused across races, so start from empty buffers
+    _lap_rows.clear()
+    _tel_tables.clear()
+
+    # Stored names are stripped so readers can filter on race_name directly
+    race_name = race_name.strip()
     print(f"Loading session for {race_name}...")
     session = ff1.get_session(year, race_name, 'Race')
     session.load()
@@ -109,8 +188,8 @@ def process_race_data(year, race_name, con):
             lap_time_fast = fastest_lap['LapTime']
             tel_fast = fastest_lap.get_telemetry().add_distance().reset_index(drop=True)
             
-            insert_lap_summary(con, year, race_name, driver, 'fastest', lap_num_fast, lap_time_fast)
-            insert_telemetry(con, tel_fast, year, race_name, driver, 'fastest', lap_num_fast)
+            insert_lap_summary(year, race_name, driver, 'fastest', lap_num_fast, lap_time_fast)
+            insert_telemetry(tel_fast, year, race_name, driver, 'fastest', lap_num_fast)
 
             # Process slowest lap
             slowest_lap = driver_laps.loc[driver_laps['LapTime'].idxmax()]
@@ -118,8 +197,8 @@ def process_race_data(year, race_name, con):
             lap_time_slow = slowest_lap['LapTime']
             tel_slow = slowest_lap.get_telemetry().add_distance().reset_index(drop=True)
             
-            insert_lap_summary(con, year, race_name, driver, 'slowest', lap_num_slow, lap_time_slow)
-            insert_telemetry(con, tel_slow, year, race_name, driver, 'slowest', lap_num_slow)
+            insert_lap_summary(year, race_name, driver, 'slowest', lap_num_slow, lap_time_slow)
+            insert_telemetry(tel_slow, year, race_name, driver, 'slowest', lap_num_slow)
 
             if overall_fastest is None or lap_time_fast < overall_fastest[0]:
                 overall_fastest = (lap_time_fast, driver, fastest_lap)
@@ -135,42 +214,56 @@ def process_race_data(year, race_name, con):
             lap_num_overall = lap_overall['LapNumber']
             tel_overall = lap_overall.get_telemetry().add_distance().reset_index(drop=True)
             
-            insert_lap_summary(con, year, race_name, driver_overall, 'overall', lap_num_overall, lap_time_overall)
-            insert_telemetry(con, tel_overall, year, race_name, driver_overall, 'overall', lap_num_overall)
+            insert_lap_summary(year, race_name, driver_overall, 'overall', lap_num_overall, lap_time_overall)
+            insert_telemetry(tel_overall, year, race_name, driver_overall, 'overall', lap_num_overall)
         except Exception as e:
             print(f"Error processing overall fastest lap: {str(e)}")
 
+    file_name = get_race_file_name(race_name)
+    flush_lap_summary(LAP_SUMMARY_DIR / file_name)
+    flush_telemetry(TELEMETRY_DIR / file_name)
+
 def initialize_database():
     """Initialize the database with all race data"""
-    con = get_db_connection(read_only=False)
-    create_tables(con)
-    
-    for race in RACE_NAMES:
-        try:
-            print(f"\nProcessing data for {race}...")
-            process_race_data(YEAR, race, con)
-            
-            # Verify data was inserted
+    LAP_SUMMARY_DIR.mkdir(exist_ok=True)
+    TELEMETRY_DIR.mkdir(exist_ok=True)
+
+    # Races are loaded in parallel, each writing its own Parquet files
+    workers = min(MAX_WORKERS, len(RACE_NAMES))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {race: executor.submit(process_race_data, YEAR, race) for race in RACE_NAMES}
+
+        for race in RACE_NAMES:
+            try:
+                print(f"\nProcessing data for {race}...")
+                futures[race].result()
+            except Exception as e:
+                print(f"Error processing data for {race}: {str(e)}")
+                continue
+
+    if not has_race_data():
+        raise RuntimeError("No race data was written; check the FastF1 connection and try again")
+
+    con = get_db_connection()
+    try:
+        for race in RACE_NAMES:
+            # Verify data was written
             count = con.execute("""
                 SELECT COUNT(*) as count 
                 FROM lap_summary 
                 WHERE year = ? AND race_name = ?
             """, [YEAR, race]).fetchdf()['count'].iloc[0]
             print(f"Inserted {count} records for {race}")
-            
-        except Exception as e:
-            print(f"Error processing data for {race}: {str(e)}")
-            continue
-    
-    # Final verification
-    total_count = con.execute("""
-        SELECT COUNT(*) as count 
-        FROM lap_summary 
-        WHERE year = ?
-    """, [YEAR]).fetchdf()['count'].iloc[0]
-    print(f"\nTotal records in database: {total_count}")
-    
-    con.close()
+
+        # Final verification
+        total_count = con.execute("""
+            SELECT COUNT(*) as count 
+            FROM lap_summary 
+            WHERE year = ?
+        """, [YEAR]).fetchdf()['count'].iloc[0]
+        print(f"\nTotal records in database: {total_count}")
+    finally:
+        con.close()
     print("\nDatabase initialization complete!")
 
 if __name__ == "__main__":
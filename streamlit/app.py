@@ -1,5 +1,9 @@
 import streamlit as st
 from pathlib import Path
+from string import Template
+import base64
+import io
+import json
 import sys
 
 st.set_page_config(
@@ -12,7 +16,8 @@ st.set_page_config(
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from database.init_db import initialize_database, get_db_connection
+from database.init_db import initialize_database, get_db_connection, has_race_data
+from database.drivers import DRIVER_DICT
 
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -22,41 +27,108 @@ from matplotlib.collections import LineCollection
 import numpy as np
 import fastf1 as ff1
 import fastf1.plotting
-import time
-
-
-driver_dict = {
-    'RUS': {'name': 'George Russell', 'team': 'Mercedes'},
-    'ALB': {'name': 'Alexander Albon', 'team': 'Williams'},
-    'HUL': {'name': 'Nico Hülkenberg', 'team': 'Haas'},
-    'SAI': {'name': 'Carlos Sainz Jr.', 'team': 'Ferrari'},
-    'HAM': {'name': 'Lewis Hamilton', 'team': 'Mercedes'},
-    'BOT': {'name': 'Valtteri Bottas', 'team': 'Kick Sauber'},
-    'MAG': {'name': 'Kevin Magnussen', 'team': 'Haas'},
-    'LAW': {'name': 'Liam Lawson', 'team': 'Visa Cash App RB'},
-    'COL': {'name': 'Franco Colapinto', 'team': 'Williams'},
-    'ALO': {'name': 'Fernando Alonso', 'team': 'Aston Martin'},
-    'PIA': {'name': 'Oscar Piastri', 'team': 'McLaren'},
-    'RIC': {'name': 'Daniel Ricciardo', 'team': 'Visa Cash App RB'},
-    'VER': {'name': 'Max Verstappen', 'team': 'Red Bull Racing'},
-    'STR': {'name': 'Lance Stroll', 'team': 'Aston Martin'},
-    'PER': {'name': 'Sergio Pérez', 'team': 'Red Bull Racing'},
-    'OCO': {'name': 'Esteban Ocon', 'team': 'Alpine'},
-    'GAS': {'name': 'Pierre Gasly', 'team': 'Alpine'},
-    'ZHO': {'name': 'Zhou Guanyu', 'team': 'Kick Sauber'},
-    'TSU': {'name': 'Yuki Tsunoda', 'team': 'Visa Cash App RB'},
-    'LEC': {'name': 'Charles Leclerc', 'team': 'Ferrari'},
-    'NOR': {'name': 'Lando Norris', 'team': 'McLaren'},
-    'SAR': {'name': 'Logan Sargeant', 'team': 'Williams'}
-}
+
+
+# Browser-side player: the static track image is shipped once and the two driver
+# markers are moved in JavaScript, so playback never round-trips to Python
+ANIMATION_TEMPLATE = Template("""
+<div style="font-family: 'Source Sans Pro', sans-serif;">
+  <div style="margin-bottom: 8px;">
+    <button id="play">▶️ Play Animation</button>
+    <button id="restart">🔄 Restart Animation</button>
+  </div>
+  <label for="frame">🕹️ Select Frame</label>
+  <input id="frame" type="range" min="0" max="$max_frame" value="0" style="width: 100%;">
+  <svg viewBox="0 0 $width $height" style="width: 100%; max-width: ${width}px; height: auto;">
+    <image href="data:image/png;base64,$image" width="$width" height="$height"/>
+    <circle id="selected" r="$radius" fill="black"/>
+    <circle id="fastest" r="$radius" fill="gold"/>
+  </svg>
+</div>
+<script>
+  const selected = $selected;
+  const fastest = $fastest;
+  const maxFrame = $max_frame;
+  const framesPerSecond = $frames_per_second;
+  const playButton = document.getElementById("play");
+  const slider = document.getElementById("frame");
+  const selectedDot = document.getElementById("selected");
+  const fastestDot = document.getElementById("fastest");
+  let frame = 0;
+  let playing = false;
+  let startFrame = 0;
+  let startTime = null;
+
+  function draw() {
+    selectedDot.setAttribute("cx", selected[0][frame]);
+    selectedDot.setAttribute("cy", selected[1][frame]);
+    fastestDot.setAttribute("cx", fastest[0][frame]);
+    fastestDot.setAttribute("cy", fastest[1][frame]);
+    slider.value = frame;
+  }
+
+  function setPlaying(value) {
+    playing = value;
+    playButton.textContent = playing ? "⏸️ Pause Animation" : "▶️ Play Animation";
+    if (playing) {
+      startFrame = frame;
+      startTime = null;
+      requestAnimationFrame(tick);
+    }
+  }
+
+  // Advance by elapsed time so playback speed doesn't depend on the display refresh rate
+  function tick(now) {
+    if (!playing) return;
+    if (startTime === null) startTime = now;
+    frame = Math.min(startFrame + Math.floor((now - startTime) * framesPerSecond / 1000), maxFrame);
+    draw();
+    if (frame >= maxFrame) {
+      setPlaying(false);
+    } else {
+      requestAnimationFrame(tick);
+    }
+  }
+
+  playButton.onclick = () => {
+    if (frame >= maxFrame) frame = 0;
+    setPlaying(!playing);
+  };
+  document.getElementById("restart").onclick = () => {
+    frame = 0;
+    setPlaying(false);
+    draw();
+  };
+  slider.oninput = () => {
+    frame = Number(slider.value);
+    startFrame = frame;
+    startTime = null;
+    draw();
+  };
+  draw();
+</script>
+""")
+
+
+@st.cache_resource
+def get_conn():
+    """DuckDB connection with views over the race Parquet files, shared for the lifetime of the app.
+
+    Queries go through get_conn().cursor(), which reuses the open database but
+    gives each session's thread its own cursor.
+    """
+    return get_db_connection()
 
 
 def ensure_database_exists():
-    """Check if database exists, if not create and populate it"""
-    db_path = Path("database/track_db.duckdb")
-    if not db_path.exists():
+    """Check if race data exists, if not download and store it"""
+    if not has_race_data():
         st.info("Initializing database...")
-        initialize_database()
+        try:
+            initialize_database()
+        except RuntimeError as e:
+            st.error(f"Database initialization failed: {e}")
+            st.stop()
         st.success("Database initialized!")
     else:
         st.info("Database already exists!")
@@ -83,21 +155,22 @@ def main():
     # -- Sidebar: Race selection
     selected_race = st.sidebar.selectbox("Select a Race:", RACE_NAMES)
 
-    # -- Driver selection
+    # -- Lap summary for the race (drivers, lap options and overall fastest lap)
     @st.cache_data
-    def get_drivers(race_name):
-        con = get_db_connection()
+    def get_lap_summary(race_name):
+        con = get_conn().cursor()
         df = con.execute("""
-            SELECT DISTINCT driver_code 
+            SELECT driver_code, lap_category, lap_number, lap_time 
             FROM lap_summary 
-            WHERE year = ? AND TRIM(race_name) = ?
+            WHERE year = ? AND race_name = ?
         """, [2024, race_name]).fetchdf()
-        con.close()
-        # Create a mapping of driver names to codes for the dropdown
-        driver_options = {f"{driver_dict[code]['name']} ({code})": code for code in df['driver_code'].tolist()}
-        return driver_options
+        return df
 
-    driver_options = get_drivers(selected_race)
+    summary_df = get_lap_summary(selected_race)
+
+    # -- Driver selection
+    # Create a mapping of driver names to codes for the dropdown
+    driver_options = {f"{DRIVER_DICT[code]['name']} ({code})": code for code in summary_df['driver_code'].unique()}
     if not driver_options:
         st.error(f"No drivers found for {selected_race}")
         st.stop()
@@ -106,18 +179,7 @@ def main():
     selected_driver = driver_options[selected_driver_name]  # This is the driver code
 
     # -- Lap selection
-    @st.cache_data
-    def get_lap_options(race_name, driver_code):
-        con = get_db_connection()
-        df = con.execute("""
-            SELECT lap_number, lap_category, lap_time 
-            FROM lap_summary
-            WHERE year = ? AND TRIM(race_name) = ? AND driver_code = ?
-        """, [2024, race_name, driver_code]).fetchdf()
-        con.close()
-        return df
-
-    lap_df = get_lap_options(selected_race, selected_driver)
+    lap_df = summary_df[summary_df['driver_code'] == selected_driver]
     if lap_df.empty:
         st.error(f"No laps found for {selected_driver} in {selected_race}")
         st.stop()
@@ -126,11 +188,11 @@ def main():
         fastest_lap = lap_df[lap_df['lap_category'] == 'fastest'].iloc[0]
         slowest_lap = lap_df[lap_df['lap_category'] == 'slowest'].iloc[0]
         lap_options = {
-            f"Lap {fastest_lap['lap_number']} (Fastest)": fastest_lap['lap_number'],
-            f"Lap {slowest_lap['lap_number']} (Slowest)": slowest_lap['lap_number']
+            f"Lap {fastest_lap['lap_number']} (Fastest)": ('fastest', fastest_lap['lap_number']),
+            f"Lap {slowest_lap['lap_number']} (Slowest)": ('slowest', slowest_lap['lap_number'])
         }
         selected_lap_label = st.sidebar.selectbox("Select Lap:", list(lap_options.keys()))
-        selected_lap_number = lap_options[selected_lap_label]
+        selected_lap_category, selected_lap_number = lap_options[selected_lap_label]
     except IndexError:
         st.error(f"Could not find fastest/slowest laps for {selected_driver}")
         st.stop()
@@ -138,53 +200,99 @@ def main():
     # -- Telemetry variable selection
     telemetry_var = st.sidebar.selectbox("Telemetry Variable:", ['Speed', 'Throttle', 'nGear', 'Brake', 'RPM'])
 
-    # -- Get telemetry and fastest lap data
-    try:
-        con = get_db_connection()
-
-        selected_tel = con.execute("""
-            SELECT * FROM telemetry
-            WHERE year = ? AND TRIM(race_name) = ? AND driver_code = ? AND lap_number = ?
-        """, [2024, selected_race, selected_driver, int(selected_lap_number)]).fetchdf()
-
-        fastest_driver_df = con.execute("""
-            SELECT driver_code, lap_number FROM lap_summary
-            WHERE year = ? AND TRIM(race_name) = ? AND lap_category = 'overall'
-        """, [2024, selected_race]).fetchdf()
-
-        if fastest_driver_df.empty:
-            st.error(f"No overall fastest lap found for {selected_race}")
-            st.stop()
+    # -- Telemetry for a single lap
+    # Cached as a shared resource: Arrow tables are immutable, and cache_data would
+    # hand back an unpickled copy on every hit
+    @st.cache_resource(show_spinner=False)
+    def load_telemetry(race_name, driver_code, lap_category, lap_number):
+        con = get_conn().cursor()
+        # Fetched as Arrow so the numeric columns reach NumPy without a pandas copy;
+        # Brake is read as 0/1 so it can be color-mapped like the other variables
+        tel = con.execute("""
+            SELECT telemetry_index, X, Y, Speed, Throttle, nGear,
+                   CAST(Brake AS TINYINT) AS Brake, RPM, Distance
+            FROM telemetry
+            WHERE year = ? AND race_name = ? AND driver_code = ? AND lap_category = ? AND lap_number = ?
+            ORDER BY telemetry_index
+        """, [2024, race_name, driver_code, lap_category, int(lap_number)]).fetch_arrow_table()
+        return tel
+
+    # -- Value ranges for a single lap, for axis limits and color normalization
+    @st.cache_data(show_spinner=False)
+    def load_lap_ranges(race_name, driver_code, lap_category, lap_number):
+        columns = ['X', 'Y', 'Speed', 'Throttle', 'nGear', 'Brake', 'RPM']
+        # Missing samples are stored as nulls, which MIN/MAX skip
+        aggregates = ', '.join(
+            f"MIN(CAST({c} AS FLOAT)), MAX(CAST({c} AS FLOAT))"
+            for c in columns
+        )
+        con = get_conn().cursor()
+        row = con.execute(f"""
+            SELECT {aggregates} FROM telemetry
+            WHERE year = ? AND race_name = ? AND driver_code = ? AND lap_category = ? AND lap_number = ?
+        """, [2024, race_name, driver_code, lap_category, int(lap_number)]).fetchone()
+        return {c: (row[2 * i], row[2 * i + 1]) for i, c in enumerate(columns)}
+
+    def column(tel, name):
+        # Read-only view of the cached table for single-chunk columns without nulls;
+        # columns with nulls are copied, with nulls as NaN
+        return tel.column(name).to_numpy()
+
+    # -- Track segments for a single lap, independent of the telemetry variable
+    @st.cache_data(show_spinner=False)
+    def build_segments(race_name, driver_code, lap_category, lap_number):
+        tel = load_telemetry(race_name, driver_code, lap_category, lap_number)
+        points = np.stack([column(tel, 'X'), column(tel, 'Y')], axis=-1)[:, None, :]
+        return np.concatenate([points[:-1], points[1:]], axis=1)
+
+    # -- Rendered player for a selection; the figure is only rebuilt when the selection changes
+    @st.cache_data(show_spinner=False)
+    def render_player(selected_race, selected_driver, selected_lap_category, selected_lap_number,
+                      fastest_driver, fastest_lap_number, telemetry_var):
+        selected_tel = load_telemetry(selected_race, selected_driver, selected_lap_category, selected_lap_number)
+        fastest_tel = load_telemetry(selected_race, fastest_driver, 'overall', fastest_lap_number)
+
+        x = column(selected_tel, 'X')
+        y = column(selected_tel, 'Y')
+        fastest_x = column(fastest_tel, 'X')
+        fastest_y = column(fastest_tel, 'Y')
 
-        fastest_driver = fastest_driver_df['driver_code'].iloc[0]
-        fastest_lap_number = int(fastest_driver_df['lap_number'].iloc[0])
-
-        fastest_tel = con.execute("""
-            SELECT * FROM telemetry
-            WHERE year = ? AND TRIM(race_name) = ? AND driver_code = ? AND lap_number = ?
-        """, [2024, selected_race, fastest_driver, fastest_lap_number]).fetchdf()
-
-        con.close()
-
-    
         # Precompute valid indices for animation
-        selected_valid = selected_tel[['X', 'Y']].dropna().index.to_numpy()
-        fastest_valid = fastest_tel[['X', 'Y']].dropna().index.to_numpy()
+        selected_valid = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+        fastest_valid = np.flatnonzero(~np.isnan(fastest_x) & ~np.isnan(fastest_y))
 
         frame_count = min(len(selected_valid), len(fastest_valid))
-        frame_indices = np.linspace(0, frame_count - 1, frame_count).astype(int)
 
         # Add interpolation points between frames
         interpolation_factor = 3  # Number of interpolated points between each frame
-        interpolated_indices = np.linspace(0, frame_count - 1, frame_count * interpolation_factor)
+        frame_positions = np.arange(frame_count * interpolation_factor) / interpolation_factor
+        prev_idx = frame_positions.astype(np.intp)
+        next_idx = np.minimum(prev_idx + 1, frame_count - 1)
+        alpha = frame_positions - prev_idx  # interpolation factor between 0 and 1
+
+        def interpolate(values, valid):
+            values = values[valid]
+            return (1 - alpha) * values[prev_idx] + alpha * values[next_idx]
+
+        # Precompute both drivers' marker trajectories for every animation frame
+        selected_x_interp = interpolate(x, selected_valid)
+        selected_y_interp = interpolate(y, selected_valid)
+        fastest_x_interp = interpolate(fastest_x, fastest_valid)
+        fastest_y_interp = interpolate(fastest_y, fastest_valid)
+
+        # Axis limits and color scale are constant for the whole animation
+        selected_ranges = load_lap_ranges(selected_race, selected_driver, selected_lap_category, selected_lap_number)
+        fastest_ranges = load_lap_ranges(selected_race, fastest_driver, 'overall', fastest_lap_number)
+        xlim = (min(selected_ranges['X'][0], fastest_ranges['X'][0]) - 100,
+                max(selected_ranges['X'][1], fastest_ranges['X'][1]) + 100)
+        ylim = (min(selected_ranges['Y'][0], fastest_ranges['Y'][0]) - 100,
+                max(selected_ranges['Y'][1], fastest_ranges['Y'][1]) + 100)
+        norm = plt.Normalize(*selected_ranges[telemetry_var])
 
         # Prepare color and segment data
-        x = selected_tel['X'].to_numpy()
-        y = selected_tel['Y'].to_numpy()
-        color = selected_tel[telemetry_var].to_numpy()
+        color = column(selected_tel, telemetry_var)
 
-        points = np.array([x, y]).T.reshape(-1, 1, 2)
-        segments = np.concatenate([points[:-1], points[1:]], axis=1)
+        segments = build_segments(selected_race, selected_driver, selected_lap_category, selected_lap_number)
 
         cmap_dict = {
             'Speed': 'plasma',
@@ -202,14 +310,15 @@ def main():
             'RPM': 'RPM'
         }
 
-        # ---------- PLOT FUNCTION ----------
-        def create_frame_plot(frame_idx):
+        lc = LineCollection(segments, cmap=cmap_dict[telemetry_var], norm=norm)
+        lc.set_array(color)
+        lc.set_linewidth(4)
+
+        # ---------- PLOT FUNCTIONS ----------
+        def create_base_plot():
+            # Everything except the two driver markers is constant across frames
             fig, ax = plt.subplots(figsize=(12, 7))
 
-            norm = plt.Normalize(np.nanmin(color), np.nanmax(color))
-            lc = LineCollection(segments, cmap=cmap_dict[telemetry_var], norm=norm)
-            lc.set_array(color)
-            lc.set_linewidth(4)
             ax.add_collection(lc)
 
             ax.plot(x, y, color='lightgray', linewidth=1, alpha=0.5)
@@ -217,40 +326,21 @@ def main():
             cbar = plt.colorbar(lc, ax=ax)
             cbar.set_label(f'{telemetry_var} ({units[telemetry_var]})')
 
-            # Calculate interpolated positions
-            idx = frame_idx / interpolation_factor
-            prev_idx = int(idx)
-            next_idx = min(prev_idx + 1, frame_count - 1)
-            alpha = idx - prev_idx  # interpolation factor between 0 and 1
-
-            # Interpolate selected driver position
-            selected_prev = selected_valid[prev_idx]
-            selected_next = selected_valid[next_idx]
-            selected_x = (1 - alpha) * selected_tel['X'].iloc[selected_prev] + alpha * selected_tel['X'].iloc[selected_next]
-            selected_y = (1 - alpha) * selected_tel['Y'].iloc[selected_prev] + alpha * selected_tel['Y'].iloc[selected_next]
-
-            # Interpolate fastest driver position
-            fastest_prev = fastest_valid[prev_idx]
-            fastest_next = fastest_valid[next_idx]
-            fastest_x = (1 - alpha) * fastest_tel['X'].iloc[fastest_prev] + alpha * fastest_tel['X'].iloc[fastest_next]
-            fastest_y = (1 - alpha) * fastest_tel['Y'].iloc[fastest_prev] + alpha * fastest_tel['Y'].iloc[fastest_next]
-
-            ax.plot([selected_x], [selected_y],
-                    'ko', color='black', markersize=10, 
-                    label=f"{driver_dict[selected_driver]['name']}", zorder=10)
-            ax.plot([fastest_x], [fastest_y],
+            # Markers are drawn by the browser player; these only feed the legend
+            ax.plot([], [],
+                    'o', color='black', markersize=10, 
+                    label=f"{DRIVER_DICT[selected_driver]['name']}", zorder=10)
+            ax.plot([], [],
                     'o', color='gold', markersize=10, 
-                    label=f"{driver_dict[fastest_driver]['name']} (Fastest)", zorder=10)
+                    label=f"{DRIVER_DICT[fastest_driver]['name']} (Fastest)", zorder=10)
 
-            ax.set_xlim(min(selected_tel['X'].min(), fastest_tel['X'].min()) - 100,
-                        max(selected_tel['X'].max(), fastest_tel['X'].max()) + 100)
-            ax.set_ylim(min(selected_tel['Y'].min(), fastest_tel['Y'].min()) - 100,
-                        max(selected_tel['Y'].max(), fastest_tel['Y'].max()) + 100)
+            ax.set_xlim(*xlim)
+            ax.set_ylim(*ylim)
 
             ax.axis('equal')
             ax.axis('off')
-            ax.set_title(f'{driver_dict[selected_driver]["name"]} vs Fastest Lap ({driver_dict[fastest_driver]["name"]})')
-            plt.suptitle(f'{selected_race} 2024', fontsize=18, fontweight='bold', x=0.40)
+            ax.set_title(f'{DRIVER_DICT[selected_driver]["name"]} vs Fastest Lap ({DRIVER_DICT[fastest_driver]["name"]})')
+            fig.suptitle(f'{selected_race} 2024', fontsize=18, fontweight='bold', x=0.40)
 
             # Adjust legend position based on race
             if selected_race in ['Singapore Grand Prix', 'United States Grand Prix']:
@@ -258,47 +348,55 @@ def main():
             else:
                 ax.legend(loc='upper right')
 
-            plt.tight_layout()
+            fig.tight_layout()
+
+            return fig, ax
+
+        def create_animation_html(fig, ax):
+            # Render the static figure once and map both trajectories to image pixels
+            fig.canvas.draw()
+            width, height = fig.canvas.get_width_height()
+
+            def to_pixels(xs, ys):
+                px, py = ax.transData.transform(np.column_stack([xs, ys])).T
+                return [np.round(px, 1).tolist(), np.round(height - py, 1).tolist()]
+
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png', dpi=fig.dpi)
+
+            return ANIMATION_TEMPLATE.substitute(
+                image=base64.b64encode(buf.getvalue()).decode('ascii'),
+                width=width,
+                height=height,
+                radius=5 * fig.dpi / 72,  # markersize=10 points
+                selected=json.dumps(to_pixels(selected_x_interp, selected_y_interp)),
+                fastest=json.dumps(to_pixels(fastest_x_interp, fastest_y_interp)),
+                max_frame=frame_count * interpolation_factor - 1,
+                frames_per_second=120
+            )
 
-            return fig
+        fig, ax = create_base_plot()
+        animation_html = create_animation_html(fig, ax)
+        plt.close(fig)
+        return animation_html
+
+    # -- Get fastest lap and render the animation
+    try:
+        fastest_driver_df = summary_df[summary_df['lap_category'] == 'overall']
+
+        if fastest_driver_df.empty:
+            st.error(f"No overall fastest lap found for {selected_race}")
+            st.stop()
+
+        fastest_driver = fastest_driver_df['driver_code'].iloc[0]
+        fastest_lap_number = int(fastest_driver_df['lap_number'].iloc[0])
 
         # ---------- UI ----------
-        col1, col2 = st.columns([1, 3])
-        with col1:
-            # Initialize session state variables
-            if 'is_playing' not in st.session_state:
-                st.session_state.is_playing = False
-            if 'current_frame' not in st.session_state:
-                st.session_state.current_frame = 0
-            
-            # Play/Pause button
-            if st.button("▶️ Play Animation" if not st.session_state.is_playing else "⏸️ Pause Animation"):
-                st.session_state.is_playing = not st.session_state.is_playing
-            
-            # Restart button
-            if st.button("🔄 Restart Animation"):
-                st.session_state.current_frame = 0
-                st.session_state.is_playing = False
-
-        # Frame slider
-        frame_idx = st.slider("🕹️ Select Frame", 0, frame_count * interpolation_factor - 1, 
-                            st.session_state.current_frame)
-        st.session_state.current_frame = frame_idx
-        
-        fig = create_frame_plot(frame_idx)
-        plot_placeholder = st.empty()
-        plot_placeholder.pyplot(fig)
-
-        if st.session_state.is_playing:
-            # Animate with interpolated frames, skipping every other frame
-            for frame in range(st.session_state.current_frame, frame_count * interpolation_factor, 10):
-                if not st.session_state.is_playing:  # Check if paused
-                    break
-                st.session_state.current_frame = frame
-                fig = create_frame_plot(frame)
-                plot_placeholder.pyplot(fig)
-                plt.close(fig)
-                time.sleep(0.0000000000001)  # Minimal sleep time
+        animation_html = render_player(
+            selected_race, selected_driver, selected_lap_category, int(selected_lap_number),
+            fastest_driver, fastest_lap_number, telemetry_var
+        )
+        st.iframe(animation_html, height="content")
 
     except Exception as e:
         st.error(f"An error occurred: {e}")